@@ -0,0 +1,96 @@
+"""
+This is the "migrate_shops" file.
+
+The migrate_shops file upgrades a database created before drinks belonged to
+shops without losing its drinks. It creates the shop table with the default
+shop, adds the shop_id column to the drink table and replaces the unique
+title with a title unique per shop. SQLite can't drop a constraint with
+ALTER TABLE so the drink table is rebuilt.
+
+Run it from within the `./backend` directory:
+
+    python migrate_shops.py [database files]
+
+Without arguments it migrates the primary database and the read replicas
+set in `./src/.env`.
+"""
+import os
+import sqlite3
+import sys
+
+from settings import DB_NAME, DB_REPLICA_NAMES
+
+project_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'src', 'database')
+
+# the ID and name of the shop which the existing drinks are moved to, they
+# must match DEFAULT_SHOP_ID and the seeded shop in src/database/models.py
+DEFAULT_SHOP_ID = 1
+DEFAULT_SHOP_NAME = 'Main'
+
+MIGRATION = '''
+CREATE TABLE IF NOT EXISTS shop (
+    id INTEGER NOT NULL,
+    name VARCHAR(80) NOT NULL,
+    PRIMARY KEY (id),
+    UNIQUE (name)
+);
+INSERT OR IGNORE INTO shop (id, name) VALUES ({shop_id}, '{shop_name}');
+CREATE TABLE drink_migrated (
+    id INTEGER NOT NULL,
+    shop_id INTEGER NOT NULL,
+    title VARCHAR(80),
+    recipe VARCHAR(180) NOT NULL,
+    PRIMARY KEY (id),
+    UNIQUE (shop_id, title),
+    FOREIGN KEY(shop_id) REFERENCES shop (id)
+);
+INSERT INTO drink_migrated (id, shop_id, title, recipe)
+    SELECT id, {shop_id}, title, recipe FROM drink;
+DROP TABLE drink;
+ALTER TABLE drink_migrated RENAME TO drink;
+'''.format(shop_id=DEFAULT_SHOP_ID, shop_name=DEFAULT_SHOP_NAME)
+
+
+def migrate(path):
+    """
+    Migrates a SQLite database file, a file which is migrated already is
+    left alone. The migration runs in one transaction so a failed migration
+    leaves the file unchanged.
+
+    Arguments:
+        path (str): The path of the database file
+
+    Returns:
+        migrated (boolean): Whether the file was migrated
+    """
+    connection = sqlite3.connect(path, isolation_level=None)
+    try:
+        columns = [row[1] for row in
+                   connection.execute('PRAGMA table_info(drink)')]
+        if not columns or 'shop_id' in columns:
+            return False
+        connection.execute('BEGIN')
+        try:
+            for statement in MIGRATION.split(';'):
+                if statement.strip():
+                    connection.execute(statement)
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return True
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    paths = sys.argv[1:] or [os.path.join(project_dir, name)
+                             for name in [DB_NAME] + DB_REPLICA_NAMES]
+    for path in paths:
+        if not os.path.exists(path):
+            print('{}: not found'.format(path))
+        elif migrate(path):
+            print('{}: migrated'.format(path))
+        else:
+            print('{}: nothing to migrate'.format(path))
@@ -4,6 +4,10 @@ import os
 load_dotenv()
 DB_NAME = os.environ.get("DB_NAME")
 DB_NAME_TEST = os.environ.get("DB_NAME_TEST")
+DB_REPLICA_NAMES = [name for name in
+                    os.environ.get("DB_REPLICA_NAMES", "").split(",") if name]
+DB_REPLICA_LAG = float(os.environ.get("DB_REPLICA_LAG", 5))
+CATALOG_MAX_AGE = int(os.environ.get("CATALOG_MAX_AGE", 60))
 AUTH0_DOMAIN = os.environ.get("AUTH0_DOMAIN")
 ALGORITHMS = [os.environ.get("ALGORITHMS")]
 API_AUDIENCE = os.environ.get("API_AUDIENCE")
@@ -9,12 +9,16 @@ from sqlalchemy import exc
 import json
 from flask_cors import CORS
 
-from .database.models import db_drop_and_create_all, setup_db, Drink
+from .database.models import db_drop_and_create_all, setup_db, Drink, \
+    Shop, get_drink, get_drink_by_title, use_primary, catalog, \
+    db_sync_replicas, DEFAULT_SHOP_ID
+from .database.routing import LAST_WRITE_HEADER
 from .auth.auth import AuthError, requires_auth
 
 app = Flask(__name__)
 setup_db(app)
-CORS(app, resources={r"/*": {"origins": "*"}})
+CORS(app, resources={r"/*": {"origins": "*"}},
+     expose_headers=[LAST_WRITE_HEADER])
 
 '''
 !! NOTE THIS WILL DROP ALL RECORDS AND START YOUR DB FROM SCRATCH
@@ -24,12 +28,21 @@ CORS(app, resources={r"/*": {"origins": "*"}})
 # db_drop_and_create_all()
 
 
+@app.cli.command('sync-replicas')
+def sync_replicas():
+    """
+    Copies the primary database into the SQLite read replicas, run with
+    `flask sync-replicas`.
+    """
+    db_sync_replicas()
+
+
 @app.after_request
 def after_request(response):
     """
     This is part of the CORS implementation and modifies the response after
-    the request. This adds the Content-Type and Authorization headers and the
-    also allowed request types.
+    the request. This adds the Content-Type, Authorization and X-Last-Write
+    headers and the also allowed request types.
 
     Arguments:
         response (obj): The response object which include response headers.
@@ -38,7 +51,7 @@ def after_request(response):
         response (obj): The modified response object.
     """
     response.headers.add('Access-Control-Allow-Headers',
-                         'Content-Type, Authorization')
+                         'Content-Type, Authorization, ' + LAST_WRITE_HEADER)
     response.headers.add('Access-Control-Allow-Headers',
                          'GET, POST, PATCH, DELETE, OPTIONS')
 
@@ -50,8 +63,8 @@ def after_request(response):
 @app.route('/drinks')
 def retrieve_drinks():
     """
-    This is a GET request to retreives all drinks. This is a public
-    endpoint and doesn't require any permision or authentication.
+    This is a GET request to retreives all drinks of the default shop. This
+    is a public endpoint and doesn't require any permision or authentication.
 
     Arguments:
         None
@@ -64,7 +77,8 @@ def retrieve_drinks():
     Aborts with an http error code 404:
         - If there are no drinks
     """
-    all_drinks = Drink.query.all()
+    all_drinks = Drink.query.filter(Drink.shop_id == DEFAULT_SHOP_ID)\
+        .order_by(Drink.id).all()
     if not all_drinks:
         abort(404)
     drinks = [drink.short() for drink in all_drinks]
@@ -75,14 +89,73 @@ def retrieve_drinks():
     })
 
 
+@app.route('/drinks/<int:drink_id>')
+def retrieve_drink(drink_id):
+    """
+    This is a GET request to retreive a single drink of the default shop by
+    its ID. This is a public endpoint and doesn't require any permision or
+    authentication. The drink is served from the in-memory catalog, the
+    database is only queried when the catalog misses.
+
+    Arguments:
+        drink_id (int): the ID of the drink to be retreived.
+
+    Returns:
+        JSON which includes:
+            - success (boolean): Value of 'True'
+            - drinks (list): Short representation of the retreived drink
+
+    Aborts with an http error code 404:
+        - If the requested drink is not found in the default shop
+    """
+    drink = get_drink(DEFAULT_SHOP_ID, drink_id)
+    if not drink:
+        abort(404)
+
+    return jsonify({
+        'success': True,
+        'drinks': [drink.short()]
+    })
+
+
+@app.route('/drinks/by-title/<string:title>')
+def retrieve_drink_by_title(title):
+    """
+    This is a GET request to retreive a single drink of the default shop by
+    its title, the title is matched case-insensitively. This is a public
+    endpoint and doesn't require any permision or authentication. The drink
+    is served from the in-memory catalog, the database is only queried when
+    the catalog misses.
+
+    Arguments:
+        title (str): the title of the drink to be retreived.
+
+    Returns:
+        JSON which includes:
+            - success (boolean): Value of 'True'
+            - drinks (list): Short representation of the retreived drink
+
+    Aborts with an http error code 404:
+        - If the requested drink is not found
+    """
+    drink = get_drink_by_title(DEFAULT_SHOP_ID, title)
+    if not drink:
+        abort(404)
+
+    return jsonify({
+        'success': True,
+        'drinks': [drink.short()]
+    })
+
+
 @app.route('/drinks-detail')
 @requires_auth('get:drinks-detail')
 def retrieve_drink_details(token):
     """
-    This is a GET request to retreive all the drink details. This requires
-    authentication and only roles with the 'get:drinks-detail' can interact
-    with this endpoint successfully otherwise will encounter an authorization
-    error.
+    This is a GET request to retreive all the drink details of the default
+    shop. This requires authentication and only roles with the
+    'get:drinks-detail' can interact with this endpoint successfully
+    otherwise will encounter an authorization error.
 
     Arguments:
         token (str): The JWT token will be passed to be checked and verified
@@ -96,7 +169,8 @@ def retrieve_drink_details(token):
     Aborts with an http error code 404:
         - If there are no drinks
     """
-    all_drinks = Drink.query.all()
+    all_drinks = Drink.query.filter(Drink.shop_id == DEFAULT_SHOP_ID)\
+        .order_by(Drink.id).all()
     if not all_drinks:
         abort(404)
     drinks = [drink.long() for drink in all_drinks]
@@ -111,9 +185,10 @@ def retrieve_drink_details(token):
 @requires_auth('post:drinks')
 def add_drinks(token):
     """
-    This is a POST request to create a new drink. This requires authentication
-     and only roles with the 'post:drinks' can interact with this endpoint
-     successfully otherwise will encounter an authorization error.
+    This is a POST request to create a new drink in the default shop. This
+     requires authentication and only roles with the 'post:drinks' can
+     interact with this endpoint successfully otherwise will encounter an
+     authorization error.
 
     Arguments:
         token (str): The JWT token will be passed to be checked and verified
@@ -128,6 +203,29 @@ def add_drinks(token):
     Aborts with an http error code 422:
         - If the drink title is empty or not provided
         - If the drink recipe is not a list or not provided
+        - If the default shop already has a drink with the title
+    """
+    return create_drink(DEFAULT_SHOP_ID)
+
+
+def create_drink(shop_id):
+    """
+    Creates a new drink in a shop from the title and recipe in the request
+    body.
+
+    Arguments:
+        shop_id (int): the ID of the shop which sells the drink.
+
+    Returns:
+        JSON which includes:
+            - success (boolean): Value of 'True'
+            - drinks (list): Long representation of the created drink
+            - created (int): The ID of the created string
+
+    Aborts with an http error code 422:
+        - If the drink title is empty or not provided
+        - If the drink recipe is not a list or not provided
+        - If the shop already has a drink with the title
     """
     body = request.get_json()
     title = body.get('title', None)
@@ -140,7 +238,7 @@ def add_drinks(token):
             raise ValueError
 
         recipe = json.dumps(recipe_json)
-        drink = Drink(title=title, recipe=recipe)
+        drink = Drink(shop_id=shop_id, title=title, recipe=recipe)
         drink.insert()
     except Exception:
         abort(422)
@@ -156,9 +254,10 @@ def add_drinks(token):
 @requires_auth('patch:drinks')
 def update_existing_drink(token, drink_id):
     """
-    This is a PATCH request to update an existing drink. This requires
-    authentication and only roles with the 'patch:drinks' can interact with
-    this endpoint successfully otherwise will encounter an authorization error.
+    This is a PATCH request to update an existing drink of the default shop.
+    This requires authentication and only roles with the 'patch:drinks' can
+    interact with this endpoint successfully otherwise will encounter an
+    authorization error.
 
     Arguments:
         token (str): The JWT token will be passed to be checked and verified
@@ -174,13 +273,35 @@ def update_existing_drink(token, drink_id):
 
     Aborts with:
         An http error code 404:
-            - If the requested drink is not found
+            - If the requested drink is not found in the default shop
         An http error code 422:
             - If both the drink title and recipe are not povided
     """
-    drink = Drink.query.filter(Drink.id == drink_id).one_or_none()
-    if not drink:
-        abort(404)
+    return update_drink(DEFAULT_SHOP_ID, drink_id)
+
+
+def update_drink(shop_id, drink_id):
+    """
+    Updates a drink of a shop with the title and recipe in the request body.
+
+    Arguments:
+        shop_id (int): the ID of the shop which sells the drink.
+
+        drink_id (int): the ID of the drink to be updated.
+
+    Returns:
+        JSON which includes:
+            - success (boolean): Value of 'True'
+            - drinks (list): Long representation of the updated drink
+            - updated (int): The ID of the updated string
+
+    Aborts with:
+        An http error code 404:
+            - If the requested drink is not found in the shop
+        An http error code 422:
+            - If both the drink title and recipe are not povided
+    """
+    drink = find_drink(shop_id, drink_id)
     body = request.get_json()
     title = body.get('title', None)
     recipe = body.get('recipe', None)
@@ -203,9 +324,10 @@ def update_existing_drink(token, drink_id):
 @requires_auth('delete:drinks')
 def delete_drink(token, drink_id):
     """
-    This is a DELETE request to delete a drink. This requires authentication
-     and only roles with the 'delete:drinks' can interact with this endpoint
-     successfully otherwise will encounter an authorization error.
+    This is a DELETE request to delete a drink of the default shop. This
+     requires authentication and only roles with the 'delete:drinks' can
+     interact with this endpoint successfully otherwise will encounter an
+     authorization error.
 
     Arguments:
         token (str): The JWT token will be passed to be checked and verified
@@ -219,11 +341,29 @@ def delete_drink(token, drink_id):
             - deleted (int): The ID of the deleted string
 
     Aborts with an http error code 404:
-        - If the requested drink is not found
+        - If the requested drink is not found in the default shop
     """
-    drink = Drink.query.filter(Drink.id == drink_id).one_or_none()
-    if not drink:
-        abort(404)
+    return remove_drink(DEFAULT_SHOP_ID, drink_id)
+
+
+def remove_drink(shop_id, drink_id):
+    """
+    Deletes a drink of a shop.
+
+    Arguments:
+        shop_id (int): the ID of the shop which sells the drink.
+
+        drink_id (int): the ID of the drink to be deleted.
+
+    Returns:
+        JSON which includes:
+            - success (boolean): Value of 'True'
+            - deleted (int): The ID of the deleted string
+
+    Aborts with an http error code 404:
+        - If the requested drink is not found in the shop
+    """
+    drink = find_drink(shop_id, drink_id)
     drink.delete()
 
     return jsonify({
@@ -232,6 +372,322 @@ def delete_drink(token, drink_id):
     })
 
 
+def find_drink(shop_id, drink_id):
+    """
+    Looks up a drink of a shop in the primary database before changing it.
+
+    Arguments:
+        shop_id (int): the ID of the shop which sells the drink.
+
+        drink_id (int): the ID of the drink.
+
+    Returns:
+        drink (obj): The Drink model
+
+    Aborts with an http error code 404:
+        - If the requested drink is not found in the shop
+    """
+    use_primary()
+    drink = Drink.query.filter(Drink.id == drink_id,
+                               Drink.shop_id == shop_id).one_or_none()
+    if not drink:
+        catalog.discard(shop_id, drink_id)
+        abort(404)
+
+    return drink
+
+
+@app.route('/shops')
+def retrieve_shops():
+    """
+    This is a GET request to retreive all shops. This is a public endpoint
+    and doesn't require any permision or authentication.
+
+    Arguments:
+        None
+
+    Returns:
+        JSON which includes:
+            - success (boolean): Value of 'True'
+            - shops (list): Representation of the retreived shops
+    """
+    shops = [shop.format() for shop in Shop.query.order_by(Shop.id).all()]
+
+    return jsonify({
+        'success': True,
+        'shops': shops
+    })
+
+
+@app.route('/shops', methods=['POST'])
+@requires_auth('post:shops')
+def add_shop(token):
+    """
+    This is a POST request to create a new shop. This requires authentication
+     and only roles with the 'post:shops' can interact with this endpoint
+     successfully otherwise will encounter an authorization error.
+
+    Arguments:
+        token (str): The JWT token will be passed to be checked and verified
+        if it is valid and contains the appropiriate permissions.
+
+    Returns:
+        JSON which includes:
+            - success (boolean): Value of 'True'
+            - shops (list): Representation of the created shop
+            - created (int): The ID of the created shop
+
+    Aborts with an http error code 422:
+        - If the shop name is empty or not provided
+        - If a shop with the name already exists
+    """
+    body = request.get_json()
+    name = body.get('name', None)
+
+    try:
+        if name == '' or name is None:
+            raise ValueError
+
+        shop = Shop(name=name)
+        shop.insert()
+    except Exception:
+        abort(422)
+
+    return jsonify({
+        'success': True,
+        'shops': [shop.format()],
+        'created': shop.id
+    })
+
+
+@app.route('/shops/<int:shop_id>/drinks')
+def retrieve_shop_drinks(shop_id):
+    """
+    This is a GET request to retreive all drinks of a shop. This is a public
+    endpoint and doesn't require any permision or authentication.
+
+    Arguments:
+        shop_id (int): the ID of the shop.
+
+    Returns:
+        JSON which includes:
+            - success (boolean): Value of 'True'
+            - drinks (list): Short representation of the retreived drinks
+
+    Aborts with an http error code 404:
+        - If the requested shop is not found
+        - If the shop has no drinks
+    """
+    if not Shop.query.get(shop_id):
+        abort(404)
+    shop_drinks = Drink.query.filter(Drink.shop_id == shop_id)\
+        .order_by(Drink.id).all()
+    if not shop_drinks:
+        abort(404)
+    drinks = [drink.short() for drink in shop_drinks]
+
+    return jsonify({
+        'success': True,
+        'drinks': drinks
+    })
+
+
+@app.route('/shops/<int:shop_id>/drinks/by-title/<string:title>')
+def retrieve_shop_drink_by_title(shop_id, title):
+    """
+    This is a GET request to retreive a single drink of a shop by its title,
+    the title is matched case-insensitively. This is a public endpoint and
+    doesn't require any permision or authentication. The drink is served
+    from the in-memory catalog, the database is only queried when the catalog
+    misses.
+
+    Arguments:
+        shop_id (int): the ID of the shop.
+
+        title (str): the title of the drink to be retreived.
+
+    Returns:
+        JSON which includes:
+            - success (boolean): Value of 'True'
+            - drinks (list): Short representation of the retreived drink
+
+    Aborts with an http error code 404:
+        - If the requested drink is not found in the shop
+    """
+    drink = get_drink_by_title(shop_id, title)
+    if not drink:
+        abort(404)
+
+    return jsonify({
+        'success': True,
+        'drinks': [drink.short()]
+    })
+
+
+@app.route('/shops/<int:shop_id>/drinks-detail')
+@requires_auth('get:drinks-detail')
+def retrieve_shop_drink_details(token, shop_id):
+    """
+    This is a GET request to retreive all the drink details of a shop. This
+    requires authentication and only roles with the 'get:drinks-detail' can
+    interact with this endpoint successfully otherwise will encounter an
+    authorization error.
+
+    Arguments:
+        token (str): The JWT token will be passed to be checked and verified
+         if it is valid and contains the appropiriate permissions.
+
+        shop_id (int): the ID of the shop.
+
+    Returns:
+        JSON which includes:
+            - success (boolean): Value of 'True'
+            - drinks (list): Long representation of the retreived drinks
+
+    Aborts with an http error code 404:
+        - If the requested shop is not found
+        - If the shop has no drinks
+    """
+    if not Shop.query.get(shop_id):
+        abort(404)
+    shop_drinks = Drink.query.filter(Drink.shop_id == shop_id)\
+        .order_by(Drink.id).all()
+    if not shop_drinks:
+        abort(404)
+    drinks = [drink.long() for drink in shop_drinks]
+
+    return jsonify({
+        'success': True,
+        'drinks': drinks
+    })
+
+
+@app.route('/shops/<int:shop_id>/drinks', methods=['POST'])
+@requires_auth('post:drinks')
+def add_shop_drinks(token, shop_id):
+    """
+    This is a POST request to create a new drink in a shop. This requires
+     authentication and only roles with the 'post:drinks' can interact with
+     this endpoint successfully otherwise will encounter an authorization
+     error.
+
+    Arguments:
+        token (str): The JWT token will be passed to be checked and verified
+        if it is valid and contains the appropiriate permissions.
+
+        shop_id (int): the ID of the shop which sells the drink.
+
+    Returns:
+        JSON which includes:
+            - success (boolean): Value of 'True'
+            - drinks (list): Long representation of the created drink
+            - created (int): The ID of the created string
+
+    Aborts with:
+        An http error code 404:
+            - If the requested shop is not found
+        An http error code 422:
+            - If the drink title is empty or not provided
+            - If the drink recipe is not a list or not provided
+            - If the shop already has a drink with the title
+    """
+    if not Shop.query.get(shop_id):
+        abort(404)
+
+    return create_drink(shop_id)
+
+
+@app.route('/shops/<int:shop_id>/drinks/<int:drink_id>')
+def retrieve_shop_drink(shop_id, drink_id):
+    """
+    This is a GET request to retreive a single drink of a shop by its ID.
+    This is a public endpoint and doesn't require any permision or
+    authentication. The drink is served from the in-memory catalog, the
+    database is only queried when the catalog misses.
+
+    Arguments:
+        shop_id (int): the ID of the shop.
+
+        drink_id (int): the ID of the drink to be retreived.
+
+    Returns:
+        JSON which includes:
+            - success (boolean): Value of 'True'
+            - drinks (list): Short representation of the retreived drink
+
+    Aborts with an http error code 404:
+        - If the requested drink is not found in the shop
+    """
+    drink = get_drink(shop_id, drink_id)
+    if not drink:
+        abort(404)
+
+    return jsonify({
+        'success': True,
+        'drinks': [drink.short()]
+    })
+
+
+@app.route('/shops/<int:shop_id>/drinks/<int:drink_id>', methods=['PATCH'])
+@requires_auth('patch:drinks')
+def update_existing_shop_drink(token, shop_id, drink_id):
+    """
+    This is a PATCH request to update an existing drink of a shop. This
+    requires authentication and only roles with the 'patch:drinks' can
+    interact with this endpoint successfully otherwise will encounter an
+    authorization error.
+
+    Arguments:
+        token (str): The JWT token will be passed to be checked and verified
+        if it is valid and contains the appropiriate permissions.
+
+        shop_id (int): the ID of the shop which sells the drink.
+
+        drink_id (int): the ID of the drink to be updated.
+
+    Returns:
+        JSON which includes:
+            - success (boolean): Value of 'True'
+            - drinks (list): Long representation of the updated drink
+            - updated (int): The ID of the updated string
+
+    Aborts with:
+        An http error code 404:
+            - If the requested drink is not found in the shop
+        An http error code 422:
+            - If both the drink title and recipe are not povided
+    """
+    return update_drink(shop_id, drink_id)
+
+
+@app.route('/shops/<int:shop_id>/drinks/<int:drink_id>', methods=['DELETE'])
+@requires_auth('delete:drinks')
+def delete_shop_drink(token, shop_id, drink_id):
+    """
+    This is a DELETE request to delete a drink of a shop. This requires
+     authentication and only roles with the 'delete:drinks' can interact with
+     this endpoint successfully otherwise will encounter an authorization
+     error.
+
+    Arguments:
+        token (str): The JWT token will be passed to be checked and verified
+        if it is valid and contains the appropiriate permissions.
+
+        shop_id (int): the ID of the shop which sells the drink.
+
+        drink_id (int): the ID of the drink to be deleted.
+
+    Returns:
+        JSON which includes:
+            - success (boolean): Value of 'True'
+            - deleted (int): The ID of the deleted string
+
+    Aborts with an http error code 404:
+        - If the requested drink is not found in the shop
+    """
+    return remove_drink(shop_id, drink_id)
+
+
 # Error Handling
 
 @app.errorhandler(422)
@@ -0,0 +1,356 @@
+"""
+This is the "catalog" file.
+
+The catalog file keeps an in-process, read-only snapshot of the drinks so
+that single drink lookups can be answered without a database round-trip.
+
+Every process keeps its own snapshot and only the writes made by that
+process update it, so a miss is not proof that a drink doesn't exist and a
+hit may be up to max_age seconds stale.
+"""
+import json
+from threading import Lock
+from time import monotonic
+
+
+class _FrozenDict(tuple):
+    """
+    A dict frozen into a tuple of (key, value) pairs.
+    """
+    __slots__ = ()
+
+
+def _freeze(value):
+    """
+    Freezes parsed JSON, dicts become _FrozenDicts and lists tuples.
+    """
+    if isinstance(value, dict):
+        return _FrozenDict((k, _freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _thaw(value):
+    """
+    Builds fresh dicts and lists from a frozen value.
+    """
+    if isinstance(value, _FrozenDict):
+        return {k: _thaw(v) for k, v in value}
+    if isinstance(value, tuple):
+        return [_thaw(v) for v in value]
+    return value
+
+
+class DrinkRecord:
+    """Defines a class DrinkRecord, a compact immutable copy of a Drink row.
+    The recipe is parsed and frozen once when the record is created, short()
+    and long() build fresh dicts from it so callers can't change the record.
+
+    Attributes:
+        id (int): The ID of the drink
+        shop_id (int): The ID of the shop which sells the drink
+        title (str): The title of the drink
+        recipe (tuple): The frozen long form recipe
+        short_recipe (tuple): The frozen short form recipe
+
+    Arguments:
+        drink_id (int): The ID of the drink
+        shop_id (int): The ID of the shop which sells the drink
+        title (str): The title of the drink
+        recipe (str): The JSON encoded recipe of the drink
+    """
+    __slots__ = ('id', 'shop_id', 'title', 'recipe', 'short_recipe')
+
+    def __init__(self, drink_id, shop_id, title, recipe):
+        parsed = json.loads(recipe)
+        object.__setattr__(self, 'id', drink_id)
+        object.__setattr__(self, 'shop_id', shop_id)
+        object.__setattr__(self, 'title', title)
+        object.__setattr__(self, 'recipe', _freeze(parsed))
+        object.__setattr__(self, 'short_recipe', _freeze(
+            [{'color': r['color'], 'parts': r['parts']} for r in parsed]))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('DrinkRecord is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('DrinkRecord is immutable')
+
+    @classmethod
+    def from_drink(cls, drink):
+        """
+        Creates a record from a Drink model.
+
+        Arguments:
+            drink (obj): The Drink model to copy
+
+        Returns:
+            record (obj): The DrinkRecord of the drink
+        """
+        return cls(drink.id, drink.shop_id, drink.title, drink.recipe)
+
+    @property
+    def key(self):
+        """
+        The key of the drink in the title index, titles are only unique
+        within a shop. Drinks without a title have no key.
+        """
+        if self.title is None:
+            return None
+        return (self.shop_id, self.title.lower())
+
+    def short(self):
+        """
+        Returns the short form representation of the drink, the same as
+        Drink.short().
+        """
+        return {
+            'id': self.id,
+            'shop_id': self.shop_id,
+            'title': self.title,
+            'recipe': _thaw(self.short_recipe)
+        }
+
+    def long(self):
+        """
+        Returns the long form representation of the drink, the same as
+        Drink.long().
+        """
+        return {
+            'id': self.id,
+            'shop_id': self.shop_id,
+            'title': self.title,
+            'recipe': _thaw(self.recipe)
+        }
+
+
+def _add(shop, record):
+    """
+    Adds a record to the indexes of a shop, titles are case-insensitive in
+    the index but not in the database so a title key can hold more than one
+    record.
+    """
+    by_id, by_title = shop[0], shop[1]
+    by_id[record.id] = record
+    if record.key is not None:
+        by_title[record.key] = by_title.get(record.key, ()) + (record,)
+
+
+def _remove(shop, record):
+    """
+    Removes a record, and only that record, from the indexes of a shop.
+    """
+    by_id, by_title = shop[0], shop[1]
+    by_id.pop(record.id, None)
+    if record.key is None:
+        return
+    records = tuple(r for r in by_title.get(record.key, ()) if r is not record)
+    if records:
+        by_title[record.key] = records
+    else:
+        by_title.pop(record.key, None)
+
+
+class DrinkCatalog:
+    """Defines a class DrinkCatalog, an index of DrinkRecords by ID and by
+    case-insensitive title, kept separately for every shop.
+
+    Every shop has its own snapshot which is loaded on the first lookup of
+    the shop and loaded again once it is older than max_age, so the cost of
+    loading, expiring and writing a shop only depends on the drinks of that
+    shop. A snapshot is never modified in place, a write copies the indexes
+    of its shop and swaps the new snapshot in with a single assignment, so
+    readers always see a complete snapshot without taking the lock. A drink
+    never moves to another shop.
+
+    Arguments:
+        max_age (int): The number of seconds after which the snapshot of a
+         shop has to be loaded again to pick up the writes of other
+         processes, None keeps it forever
+    """
+
+    def __init__(self, max_age=None):
+        self._lock = Lock()
+        self._shops = {}
+        self._loading = {}
+        self._generations = {}
+        self._epoch = 0
+        self.max_age = max_age
+
+    def loaded(self, shop_id):
+        """
+        Checks whether the snapshot of a shop is loaded and not older than
+        max_age.
+
+        Arguments:
+            shop_id (int): The ID of the shop
+
+        Returns:
+            loaded (boolean): Whether the snapshot can be used
+        """
+        shop = self._shops.get(shop_id)
+        if shop is None:
+            return False
+        return self.max_age is None or monotonic() - shop[2] < self.max_age
+
+    def generation(self, shop_id):
+        """
+        Returns the generation of a shop, it changes with every write to the
+        shop and when the catalog is cleared.
+        """
+        return (self._epoch, self._generations.get(shop_id, 0))
+
+    def ensure(self, shop_id, query, retries=3):
+        """
+        Loads the snapshot of a shop unless it is loaded already. Only one
+        caller loads a shop at a time, the others wait for it and use its
+        snapshot. A load which raced with a write is retried.
+
+        Arguments:
+            shop_id (int): The ID of the shop
+            query (function): Returns the Drink models of the shop
+            retries (int): How many times a load is tried
+
+        Returns:
+            loaded (boolean): Whether the snapshot of the shop is loaded
+        """
+        if self.loaded(shop_id):
+            return True
+        with self._lock:
+            loading = self._loading.setdefault(shop_id, Lock())
+        with loading:
+            for _ in range(retries):
+                if self.loaded(shop_id):
+                    return True
+                generation = self.generation(shop_id)
+                if self.load(shop_id, query(), generation):
+                    return True
+        return False
+
+    def load(self, shop_id, drinks, generation=None):
+        """
+        Replaces the snapshot of a shop with the given drinks.
+
+        Arguments:
+            shop_id (int): The ID of the shop
+            drinks (list): The Drink models of the shop
+            generation (tuple): The generation read before the drinks were
+             queried, if a write happened since then the load is dropped
+
+        Returns:
+            loaded (boolean): Whether the snapshot was replaced
+        """
+        shop = ({}, {})
+        for drink in drinks:
+            _add(shop, DrinkRecord.from_drink(drink))
+        with self._lock:
+            if generation is not None\
+                    and generation != self.generation(shop_id):
+                return False
+            self._shops[shop_id] = shop + (monotonic(),)
+            return True
+
+    def clear(self):
+        """
+        Drops the snapshots of all shops, the next lookups have to load them
+        again.
+        """
+        with self._lock:
+            self._epoch += 1
+            self._shops = {}
+
+    def put(self, drink):
+        """
+        Adds or replaces a drink in the snapshot of its shop.
+
+        Arguments:
+            drink (obj): The inserted or updated Drink model
+
+        Returns:
+            record (obj): The DrinkRecord of the drink
+        """
+        record = DrinkRecord.from_drink(drink)
+        with self._lock:
+            self._bump(record.shop_id)
+            shop = self._copy(record.shop_id)
+            if shop is None:
+                return record
+            previous = shop[0].get(record.id)
+            if previous is not None:
+                _remove(shop, previous)
+            _add(shop, record)
+            self._shops[record.shop_id] = shop
+        return record
+
+    def discard(self, shop_id, drink_id):
+        """
+        Removes a drink from the snapshot of its shop.
+
+        Arguments:
+            shop_id (int): The ID of the shop which sold the drink
+            drink_id (int): The ID of the deleted drink
+        """
+        with self._lock:
+            self._bump(shop_id)
+            shop = self._copy(shop_id)
+            if shop is None or drink_id not in shop[0]:
+                return
+            _remove(shop, shop[0][drink_id])
+            self._shops[shop_id] = shop
+
+    def _bump(self, shop_id):
+        """
+        Changes the generation of a shop, must be called with the lock held.
+        """
+        self._generations[shop_id] = self._generations.get(shop_id, 0) + 1
+
+    def _copy(self, shop_id):
+        """
+        Returns a copy of the snapshot of a shop which can be modified, or
+        None if the shop isn't loaded. Must be called with the lock held.
+        """
+        shop = self._shops.get(shop_id)
+        if shop is None:
+            return None
+        by_id, by_title, loaded_at = shop
+        return (dict(by_id), dict(by_title), loaded_at)
+
+    def get(self, shop_id, drink_id):
+        """
+        Looks up a drink of a shop by its ID.
+
+        Arguments:
+            shop_id (int): The ID of the shop which sells the drink
+            drink_id (int): The ID of the drink
+
+        Returns:
+            record (obj): The DrinkRecord or None if it is not found or the
+             shop isn't loaded
+        """
+        shop = self._shops.get(shop_id)
+        if shop is None:
+            return None
+        return shop[0].get(drink_id)
+
+    def get_by_title(self, shop_id, title):
+        """
+        Looks up a drink of a shop by its title, ignoring case. If titles
+        only differ in case the one matching the case of title wins.
+
+        Arguments:
+            shop_id (int): The ID of the shop which sells the drink
+            title (str): The title of the drink
+
+        Returns:
+            record (obj): The DrinkRecord or None if it is not found or the
+             shop isn't loaded
+        """
+        shop = self._shops.get(shop_id)
+        if shop is None:
+            return None
+        records = shop[1].get((shop_id, title.lower()), ())
+        for record in records:
+            if record.title == title:
+                return record
+        return records[0] if records else None
@@ -1,24 +1,46 @@
 import os
-from sqlalchemy import Column, String, Integer
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import Column, String, Integer, ForeignKey, \
+    UniqueConstraint, func
 import json
 
-from settings import DB_NAME
+from settings import DB_NAME, DB_REPLICA_NAMES, DB_REPLICA_LAG, \
+    CATALOG_MAX_AGE
+from .catalog import DrinkCatalog
+from .routing import RoutingSQLAlchemy
 
 project_dir = os.path.dirname(os.path.abspath(__file__))
 database_path = "sqlite:///{}".format(os.path.join(project_dir,
                                                    DB_NAME))
+replica_paths = ["sqlite:///{}".format(os.path.join(project_dir, name))
+                 for name in DB_REPLICA_NAMES]
 
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
+catalog = DrinkCatalog(CATALOG_MAX_AGE)
+
+# the shop which the drinks created without a shop belong to
+DEFAULT_SHOP_ID = 1
 
 '''
-setup_db(app)
+setup_db(app, database_uri, replica_uris, replica_lag)
     binds a flask application and a SQLAlchemy service
+    the queries of a request are sent to one random replica in
+    replica_uris and writes to database_uri, once a client has written
+    its queries go to database_uri as well for the rest of the request
+    and for replica_lag seconds after it
+    EXAMPLE
+        setup_db(app, 'sqlite:///primary.db',
+                 ['sqlite:///replica1.db', 'sqlite:///replica2.db'])
 '''
 
 
-def setup_db(app):
-    app.config["SQLALCHEMY_DATABASE_URI"] = database_path
+def setup_db(app, database_uri=database_path, replica_uris=replica_paths,
+             replica_lag=DB_REPLICA_LAG):
+    binds = {"replica_{}".format(i): uri
+             for i, uri in enumerate(replica_uris)}
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_uri
+    app.config["SQLALCHEMY_BINDS"] = binds
+    app.config["SQLALCHEMY_REPLICAS"] = list(binds)
+    app.config["SQLALCHEMY_REPLICA_LAG"] = replica_lag
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     db.app = app
     db.init_app(app)
@@ -34,8 +56,13 @@ db_drop_and_create_all()
 
 
 def db_drop_and_create_all():
+    catalog.clear()
     db.drop_all()
     db.create_all()
+    # add the default shop which the demo drinks belong to
+    shop_main = Shop(id=DEFAULT_SHOP_ID, name='Main')
+    shop_main.insert()
+
     # add three demo rows which is helping in POSTMAN test
     drink_water = Drink(
         title='water',
@@ -56,11 +83,143 @@ def db_drop_and_create_all():
     drink_water.insert()
     drink_machiatto.insert()
     drink_coffee.insert()
+    db_sync_replicas()
+
+
+'''
+db_sync_replicas()
+    copies the primary database into the replicas
+    only SQLite files are copied, they stand in for real replicas
+    when running locally, other replicas are kept in sync by the
+    database server
+    the replicas are not synced by the writes, so they lag behind
+    the primary until this is called, e.g. with `flask sync-replicas`
+'''
+
+
+def db_sync_replicas():
+    db.sync_replicas()
+
+
+'''
+use_primary()
+    sends the remaining queries of the request to the primary
+    database, used before reading rows which must not lag behind
+    the writes
+'''
+
+
+def use_primary():
+    db.session.info['use_primary'] = True
+
+
+'''
+get_catalog(shop_id)
+    returns the in-process drink catalog with the drinks of a shop
+    loaded from the primary database, they are loaded on the first
+    lookup of the shop and once they are older than CATALOG_MAX_AGE
+    seconds
+    if the load keeps racing with writes the catalog is returned
+    without the shop and its lookups miss
+'''
+
+
+def get_catalog(shop_id):
+    def query():
+        use_primary()
+        return Drink.query.filter(Drink.shop_id == shop_id).all()
+
+    catalog.ensure(shop_id, query)
+    return catalog
+
+
+'''
+get_drink(shop_id, drink_id)
+    returns the catalog record of a drink of a shop
+    the catalog only knows the writes of this process, so a miss is
+    looked up in the primary database and the catalog is refreshed
+    with the result
+'''
+
+
+def get_drink(shop_id, drink_id):
+    record = get_catalog(shop_id).get(shop_id, drink_id)
+    if record is not None:
+        return record
+    use_primary()
+    drink = Drink.query.filter(Drink.id == drink_id,
+                               Drink.shop_id == shop_id).one_or_none()
+    if drink is None:
+        return None
+    return catalog.put(drink)
+
+
+'''
+get_drink_by_title(shop_id, title)
+    returns the catalog record of a drink of a shop by its title,
+    ignoring case
+    a miss is looked up in the primary database and the catalog is
+    refreshed with the result
+'''
+
+
+def get_drink_by_title(shop_id, title):
+    record = get_catalog(shop_id).get_by_title(shop_id, title)
+    if record is not None:
+        return record
+    use_primary()
+    drinks = Drink.query.filter(
+        Drink.shop_id == shop_id,
+        func.lower(Drink.title) == title.lower()).all()
+    for drink in drinks:
+        catalog.put(drink)
+    return catalog.get_by_title(shop_id, title) if drinks else None
 
 
 # ROUTES
 
 
+'''
+Shop
+a persistent shop entity, extends the base SQLAlchemy Model
+every drink belongs to one shop
+'''
+
+
+class Shop(db.Model):
+    # Autoincrementing, unique primary key
+    id = Column(Integer().with_variant(Integer, "sqlite"), primary_key=True)
+    # String Name
+    name = Column(String(80), unique=True, nullable=False)
+
+    '''
+    format()
+        representation of the Shop model
+    '''
+
+    def format(self):
+        return {
+            'id': self.id,
+            'name': self.name
+        }
+
+    '''
+    insert()
+        inserts a new model into a database
+        the model must have a unique name
+        EXAMPLE
+            shop = Shop(name=req_name)
+            shop.insert()
+    '''
+
+    def insert(self):
+        db.session.add(self)
+        db.session.commit()
+
+    def __repr__(self):
+        return json.dumps(self.format())
+
+
 '''
 Drink
 a persistent drink entity, extends the base SQLAlchemy Model
@@ -68,10 +227,17 @@ a persistent drink entity, extends the base SQLAlchemy Model
 
 
 class Drink(db.Model):
+    # the title is unique per shop, the constraint also indexes the
+    # drinks by shop
+    __table_args__ = (UniqueConstraint('shop_id', 'title'),)
+
     # Autoincrementing, unique primary key
     id = Column(Integer().with_variant(Integer, "sqlite"), primary_key=True)
+    # the shop which sells the drink
+    shop_id = Column(Integer, ForeignKey('shop.id'), nullable=False,
+                     default=DEFAULT_SHOP_ID)
     # String Title
-    title = Column(String(80), unique=True)
+    title = Column(String(80))
     # the ingredients blob - this stores a lazy json blob
     # the required datatype is:
     # [{'color': string, 'name':string, 'parts':number}]
@@ -88,6 +254,7 @@ class Drink(db.Model):
                          'parts': r['parts']} for r in json.loads(self.recipe)]
         return {
             'id': self.id,
+            'shop_id': self.shop_id,
             'title': self.title,
             'recipe': short_recipe
         }
@@ -100,6 +267,7 @@ class Drink(db.Model):
     def long(self):
         return {
             'id': self.id,
+            'shop_id': self.shop_id,
             'title': self.title,
             'recipe': json.loads(self.recipe)
         }
@@ -107,16 +275,18 @@ class Drink(db.Model):
     '''
     insert()
         inserts a new model into a database
-        the model must have a unique name
+        the model must have a name unique to its shop
         the model must have a unique id or null id
         EXAMPLE
-            drink = Drink(title=req_title, recipe=req_recipe)
+            drink = Drink(shop_id=req_shop_id, title=req_title,
+                          recipe=req_recipe)
             drink.insert()
     '''
 
     def insert(self):
         db.session.add(self)
         db.session.commit()
+        catalog.put(self)
 
     '''
     delete()
@@ -128,8 +298,11 @@ class Drink(db.Model):
     '''
 
     def delete(self):
+        shop_id = self.shop_id
+        drink_id = self.id
         db.session.delete(self)
         db.session.commit()
+        catalog.discard(shop_id, drink_id)
 
     '''
     update()
@@ -143,6 +316,7 @@ class Drink(db.Model):
 
     def update(self):
         db.session.commit()
+        catalog.put(self)
 
     def __repr__(self):
         return json.dumps(self.short())
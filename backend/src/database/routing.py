@@ -0,0 +1,133 @@
+"""
+This is the "routing" file.
+
+The routing file sends reads to the read-replica databases and writes to the
+primary database.
+"""
+import os
+import random
+import sqlite3
+from time import time
+from flask import has_request_context, request
+from flask_sqlalchemy import SQLAlchemy, SignallingSession, get_state
+from sqlalchemy import orm
+from sqlalchemy.sql import Delete, Insert, Update
+
+# the header which tells a client when it last wrote to the primary, the
+# client sends it back with its following requests
+LAST_WRITE_HEADER = 'X-Last-Write'
+
+
+class RoutingSession(SignallingSession):
+    """Defines a class RoutingSession, a session which picks one random
+    read-replica for its queries and the primary for flushes and raw writes.
+
+    Once the session has written anything it sticks to the primary until it
+    is removed at the end of the request, so a request always reads its own
+    writes even if the replicas are behind. The following requests of the
+    same client stick to the primary as well while the last write they send
+    back in the X-Last-Write header is less than SQLALCHEMY_REPLICA_LAG
+    seconds old.
+    """
+
+    def get_bind(self, mapper=None, clause=None):
+        replicas = self.app.config['SQLALCHEMY_REPLICAS']
+        if self._flushing or isinstance(clause, (Delete, Insert, Update)):
+            self.info['use_primary'] = True
+            self.info['pending_write'] = True
+        if not replicas:
+            return super().get_bind(mapper, clause)
+        if 'use_primary' not in self.info:
+            self.info['use_primary'] = self._wrote_recently()
+        if self.info['use_primary']:
+            return super().get_bind(mapper, clause)
+        if 'replica' not in self.info:
+            self.info['replica'] = random.choice(replicas)
+        state = get_state(self.app)
+        return state.db.get_engine(self.app, bind=self.info['replica'])
+
+    def commit(self):
+        super().commit()
+        if self.info.pop('pending_write', False):
+            self.info['wrote'] = True
+
+    def rollback(self):
+        self.info.pop('pending_write', None)
+        super().rollback()
+
+    def _wrote_recently(self):
+        """
+        Checks the last write header of the current request.
+
+        Returns:
+            wrote (boolean): Whether the client wrote less than
+             SQLALCHEMY_REPLICA_LAG seconds ago
+        """
+        if not has_request_context():
+            return False
+        try:
+            last_write = float(request.headers.get(LAST_WRITE_HEADER, 0))
+        except ValueError:
+            return False
+        lag = self.app.config['SQLALCHEMY_REPLICA_LAG']
+        return 0 <= time() - last_write < lag
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """Defines a class RoutingSQLAlchemy, a SQLAlchemy service whose
+    sessions are RoutingSessions.
+    """
+
+    def init_app(self, app):
+        app.config.setdefault('SQLALCHEMY_REPLICAS', [])
+        app.config.setdefault('SQLALCHEMY_REPLICA_LAG', 5)
+        super().init_app(app)
+        app.after_request(self.remember_write)
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def remember_write(self, response):
+        """
+        Sets the last write header if the request committed a write to the
+        primary.
+
+        Arguments:
+            response (obj): The response of the request
+
+        Returns:
+            response (obj): The response with the header set
+        """
+        if self.session.info.get('wrote'):
+            response.headers[LAST_WRITE_HEADER] = str(time())
+        return response
+
+    def sync_replicas(self, app=None):
+        """
+        Copies the primary database into the replicas. Only SQLite files are
+        copied, they stand in for real replicas when running locally, other
+        replicas are kept in sync by the database server. The primary is
+        copied into a new file which then replaces the replica, so readers
+        of the replica never block the copy.
+
+        Arguments:
+            app (obj): The flask application, the bound one if not given
+        """
+        app = self.get_app(app)
+        primary = self.get_engine(app)
+        for bind in app.config['SQLALCHEMY_REPLICAS']:
+            replica = self.get_engine(app, bind=bind)
+            if primary.dialect.name != 'sqlite'\
+                    or replica.dialect.name != 'sqlite':
+                continue
+            path = replica.url.database
+            copy_path = path + '.sync'
+            source = primary.raw_connection()
+            target = sqlite3.connect(copy_path)
+            try:
+                source.connection.backup(target)
+            finally:
+                source.close()
+                target.close()
+            os.replace(copy_path, path)
+            replica.dispose()
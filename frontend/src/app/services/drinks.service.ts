@@ -1,5 +1,5 @@
 import { Injectable } from '@angular/core';
-import { HttpClient, HttpHeaders } from '@angular/common/http';
+import { HttpClient, HttpHeaders, HttpResponse } from '@angular/common/http';
 
 import { AuthService } from './auth.service';
 import { environment } from 'src/environments/environment';
@@ -22,6 +22,9 @@ export class DrinksService {
   url = environment.apiServerUrl;
 
   public items: {[key: number]: Drink} = {};
+
+  // when this client last wrote, sent back so that its reads see its writes
+  lastWrite: string = null;
   // = {
   //                             1: {
   //                             id: 1,
@@ -83,13 +86,24 @@ export class DrinksService {
   constructor(private auth: AuthService, private http: HttpClient) { }
 
   getHeaders() {
+    let headers = new HttpHeaders()
+      .set('Authorization',  `Bearer ${this.auth.activeJWT()}`);
+    if (this.lastWrite) {
+      headers = headers.set('X-Last-Write', this.lastWrite);
+    }
     const header = {
-      headers: new HttpHeaders()
-        .set('Authorization',  `Bearer ${this.auth.activeJWT()}`)
+      headers: headers
     };
     return header;
   }
 
+  rememberWrite(res: HttpResponse<any>) {
+    const lastWrite = res.headers.get('X-Last-Write');
+    if (lastWrite) {
+      this.lastWrite = lastWrite;
+    }
+  }
+
   getDrinks() {
     if (this.auth.can('get:drinks-detail')) {
       this.http.get(this.url + '/drinks-detail', this.getHeaders())
@@ -109,17 +123,21 @@ export class DrinksService {
 
   saveDrink(drink: Drink) {
     if (drink.id >= 0) { // patch
-      this.http.patch(this.url + '/drinks/' + drink.id, drink, this.getHeaders())
-      .subscribe( (res: any) => {
-        if (res.success) {
-          this.drinksToItems(res.drinks);
+      this.http.patch(this.url + '/drinks/' + drink.id, drink,
+        {headers: this.getHeaders().headers, observe: 'response'})
+      .subscribe( (res: HttpResponse<any>) => {
+        this.rememberWrite(res);
+        if (res.body.success) {
+          this.drinksToItems(res.body.drinks);
         }
       });
     } else { // insert
-      this.http.post(this.url + '/drinks', drink, this.getHeaders())
-      .subscribe( (res: any) => {
-        if (res.success) {
-          this.drinksToItems(res.drinks);
+      this.http.post(this.url + '/drinks', drink,
+        {headers: this.getHeaders().headers, observe: 'response'})
+      .subscribe( (res: HttpResponse<any>) => {
+        this.rememberWrite(res);
+        if (res.body.success) {
+          this.drinksToItems(res.body.drinks);
         }
       });
     }
@@ -128,9 +146,10 @@ export class DrinksService {
 
   deleteDrink(drink: Drink) {
     delete this.items[drink.id];
-    this.http.delete(this.url + '/drinks/' + drink.id, this.getHeaders())
-    .subscribe( (res: any) => {
-
+    this.http.delete(this.url + '/drinks/' + drink.id,
+      {headers: this.getHeaders().headers, observe: 'response'})
+    .subscribe( (res: HttpResponse<any>) => {
+      this.rememberWrite(res);
     });
   }
 